@@ -0,0 +1,181 @@
+/*
+ * _redact_ext - redaction of the default PII fields in a single pass.
+ *
+ * Specialised for PII_FIELDS ("name", "email", "phone", "ssn",
+ * "password") and the "***" redaction. Instead of matching every
+ * keyword at every offset, the scanner looks for '=' eight bytes at a
+ * time (SWAR) and only then checks whether the bytes before it end
+ * with a keyword. Keywords are told apart by their last character, so
+ * each '=' costs at most one memcmp.
+ *
+ * Produces the same output as
+ *     re.sub(r'(?P<field>name|email|phone|ssn|password)=[^;]*',
+ *            r'\g<field>=***', msg)
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+#define REDACTION "***"
+#define REDACTION_LEN 3
+#define SWAR_ONES 0x0101010101010101ULL
+#define SWAR_HIGHS 0x8080808080808080ULL
+
+/**
+ * swar_find - find the first occurrence of a byte
+ * @s: buffer to search
+ * @start: offset to start from
+ * @n: length of the buffer
+ * @c: byte to look for
+ *
+ * Return: offset of the byte, or -1 if it does not occur
+ */
+static Py_ssize_t swar_find(const unsigned char *s, Py_ssize_t start,
+			    Py_ssize_t n, unsigned char c)
+{
+	const uint64_t pattern = SWAR_ONES * c;
+	Py_ssize_t i = start;
+	uint64_t v;
+
+	for (; i + 8 <= n; i += 8)
+	{
+		memcpy(&v, s + i, 8);
+		v ^= pattern;
+		if ((v - SWAR_ONES) & ~v & SWAR_HIGHS)
+			break;
+	}
+	for (; i < n; i++)
+	{
+		if (s[i] == c)
+			return (i);
+	}
+	return (-1);
+}
+
+/**
+ * keyword_before - length of the PII keyword ending right before '='
+ * @s: buffer
+ * @eq: offset of the '='
+ * @lo: lowest offset the keyword may start at
+ *
+ * Return: keyword length, or 0 if no keyword ends at @eq
+ */
+static Py_ssize_t keyword_before(const unsigned char *s, Py_ssize_t eq,
+				 Py_ssize_t lo)
+{
+	const char *kw;
+	Py_ssize_t len;
+
+	if (eq <= lo)
+		return (0);
+	switch (s[eq - 1])
+	{
+	case 'e':
+		if (eq - lo >= 4 && s[eq - 4] == 'n')
+		{
+			kw = "name";
+			len = 4;
+		}
+		else
+		{
+			kw = "phone";
+			len = 5;
+		}
+		break;
+	case 'l':
+		kw = "email";
+		len = 5;
+		break;
+	case 'n':
+		kw = "ssn";
+		len = 3;
+		break;
+	case 'd':
+		kw = "password";
+		len = 8;
+		break;
+	default:
+		return (0);
+	}
+	if (eq - lo < len || memcmp(s + eq - len, kw, len) != 0)
+		return (0);
+	return (len);
+}
+
+/**
+ * redact_default - redact the default PII fields in a message
+ * @self: module
+ * @args: (msg: bytes, sep: bytes) with a single byte separator
+ *
+ * Return: the redacted message as bytes
+ */
+static PyObject *redact_default(PyObject *self, PyObject *args)
+{
+	const unsigned char *s, *sep;
+	Py_ssize_t n, sep_len, cursor = 0, scan = 0, eq, stop, o = 0;
+	PyObject *result;
+	char *out;
+
+	(void)self;
+	if (!PyArg_ParseTuple(args, "y#y#", &s, &n, &sep, &sep_len))
+		return (NULL);
+	if (sep_len != 1)
+	{
+		PyErr_SetString(PyExc_ValueError,
+				"separator must be a single byte");
+		return (NULL);
+	}
+
+	/* each match takes at least 4 input bytes and adds at most 3 */
+	result = PyBytes_FromStringAndSize(NULL,
+					   n + REDACTION_LEN * (n / 4 + 1));
+	if (result == NULL)
+		return (NULL);
+	out = PyBytes_AS_STRING(result);
+
+	while ((eq = swar_find(s, scan, n, '=')) >= 0)
+	{
+		scan = eq + 1;
+		if (keyword_before(s, eq, cursor) == 0)
+			continue;
+		memcpy(out + o, s + cursor, scan - cursor);
+		o += scan - cursor;
+		memcpy(out + o, REDACTION, REDACTION_LEN);
+		o += REDACTION_LEN;
+		stop = swar_find(s, scan, n, sep[0]);
+		if (stop < 0)
+		{
+			cursor = n;
+			break;
+		}
+		cursor = scan = stop;
+	}
+	memcpy(out + o, s + cursor, n - cursor);
+	o += n - cursor;
+
+	if (_PyBytes_Resize(&result, o) < 0)
+		return (NULL);
+	return (result);
+}
+
+static PyMethodDef redact_methods[] = {
+	{"redact_default", redact_default, METH_VARARGS,
+	 "redact_default(msg: bytes, sep: bytes) -> bytes\n\n"
+	 "Redact name, email, phone, ssn and password values with '***'."},
+	{NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef redact_module = {
+	PyModuleDef_HEAD_INIT,
+	"_redact_ext",
+	"Single pass redaction of the default PII fields.",
+	-1,
+	redact_methods,
+	NULL, NULL, NULL, NULL
+};
+
+PyMODINIT_FUNC PyInit__redact_ext(void)
+{
+	return (PyModule_Create(&redact_module));
+}
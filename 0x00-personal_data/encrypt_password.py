@@ -2,27 +2,46 @@
 """
 This script provides functions for hashing passwords and validating them.
 """
-import bcrypt
+import os
+from typing import Union
 
+import _bcrypt
 
-def hash_password(password: str) -> bytes:
+# bcrypt cost factor; each extra round doubles the hashing time
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
+
+
+def _to_pw_bytes(password: Union[str, bytes]) -> bytes:
+    """
+    Get the bytes bcrypt actually uses from a password.
+    Args:
+        password (Union[str, bytes]): The password.
+    Returns:
+        bytes: The password encoded and cut to bcrypt's 72 byte limit.
+    """
+    if not isinstance(password, bytes):
+        password = password.encode('utf-8', 'strict')
+    return password[:72]
+
+
+def hash_password(password: Union[str, bytes]) -> bytes:
     """
     Hash a password using bcrypt.
     Args:
-        password (str): The password to hash.
+        password (Union[str, bytes]): The password to hash.
     Returns:
         bytes: The hashed password.
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return _bcrypt.hashpw(_to_pw_bytes(password), BCRYPT_ROUNDS)
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
+def is_valid(hashed_password: bytes, password: Union[str, bytes]) -> bool:
     """
     Validate a password against its hashed version.
     Args:
         hashed_password (bytes): The hashed password to compare against.
-        password (str): The password to validate.
+        password (Union[str, bytes]): The password to validate.
     Returns:
         bool: True if the password is valid, False otherwise.
     """
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    return _bcrypt.checkpw(_to_pw_bytes(password), hashed_password)
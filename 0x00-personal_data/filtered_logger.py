@@ -3,23 +3,73 @@
 This script deals with logging and redaction of sensitive user data.
 """
 
+import copy
 import re
-from typing import List
+from functools import lru_cache
+from typing import AnyStr, Iterable, List, Tuple
 import logging
 import os
+import threading
 import mysql.connector
 
-# Regular expression patterns for extracting and
-# replacing sensitive information
-patterns = {
-    'extract': lambda x, y: r'(?P<field>{})=[^{}]*'.format('|'.join(x), y),
-    'replace': lambda x: r'\g<field>={}'.format(x),
-}
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from _redact_ext import redact_default
+except ImportError:
+    redact_default = None
 
 # Sensitive fields that need to be redacted
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
 
 
+@lru_cache(maxsize=64)
+def _compile_redactor(fields: Tuple[str, ...], separator: str) -> re.Pattern:
+    """
+    Compile the extraction pattern for a set of fields once per process.
+
+    Args:
+        fields (Tuple[str, ...]): Sensitive fields to match.
+        separator (str): Separator between fields in the message.
+
+    Returns:
+        re.Pattern: The compiled extraction pattern.
+    """
+    return re.compile(r'(?P<field>' + '|'.join(map(re.escape, fields)) +
+                      r')=[^' + re.escape(separator) + r']*')
+
+
+@lru_cache(maxsize=64)
+def _compile_hs_database(fields: Tuple[str, ...]) -> "hyperscan.Database":
+    """
+    Compile the Hyperscan database matching `field=` once per process.
+
+    Args:
+        fields (Tuple[str, ...]): Sensitive fields to match.
+
+    Returns:
+        hyperscan.Database: The compiled database.
+    """
+    expression = '(?:' + '|'.join(map(re.escape, fields)) + ')='
+    database = hyperscan.Database()
+    database.compile(expressions=[expression.encode()], ids=[0], elements=1,
+                     flags=[hyperscan.HS_FLAG_SOM_LEFTMOST])
+    return database
+
+
+# Pattern and replacement for the default fields, built once at import
+_DEFAULT_PATTERN = _compile_redactor(PII_FIELDS, ";")
+_DEFAULT_REPL = r'\g<field>=***'
+
+
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """
@@ -34,8 +84,61 @@ def filter_datum(fields: List[str], redaction: str,
     Returns:
         str: Message with sensitive data filtered.
     """
-    extract, replace = (patterns["extract"], patterns["replace"])
-    return re.sub(extract(fields, separator), replace(redaction), message)
+    fields = tuple(fields)
+    if fields == PII_FIELDS and separator == ';' and redaction == '***':
+        return _DEFAULT_PATTERN.sub(_DEFAULT_REPL, message)
+    pattern = _compile_redactor(fields, separator)
+    return pattern.sub(r'\g<field>={}'.format(redaction), message)
+
+
+@lru_cache(maxsize=32)
+def _get_automaton(fields: Tuple[str, ...]) -> "ahocorasick.Automaton":
+    """
+    Return the automaton matching `field=` for each of the fields.
+
+    Args:
+        fields (Tuple[str, ...]): Sensitive fields to match.
+
+    Returns:
+        ahocorasick.Automaton: The cached automaton, mapping each
+        keyword to its length.
+    """
+    automaton = ahocorasick.Automaton()
+    for field in fields:
+        keyword = field + "="
+        automaton.add_word(keyword, len(keyword))
+    automaton.make_automaton()
+    return automaton
+
+
+def _redact_spans(message: AnyStr, spans: Iterable[Tuple[int, int]],
+                  redaction: AnyStr, separator: AnyStr) -> AnyStr:
+    """
+    Replace the value following each `field=` match in a message.
+
+    Args:
+        message (AnyStr): Message containing sensitive data.
+        spans (Iterable[Tuple[int, int]]): Start and end offsets of the
+            `field=` matches, ordered by end offset.
+        redaction (AnyStr): Redaction string.
+        separator (AnyStr): Separator between fields in the message.
+
+    Returns:
+        AnyStr: Message with sensitive data filtered.
+    """
+    parts = []
+    cursor = 0
+    for start, end in spans:
+        if start < cursor:
+            continue
+        parts.append(message[cursor:end])
+        parts.append(redaction)
+        cursor = message.find(separator, end)
+        if cursor == -1:
+            cursor = len(message)
+            break
+    parts.append(message[cursor:])
+    return message[:0].join(parts)
 
 
 def get_logger() -> logging.Logger:
@@ -109,14 +212,87 @@ class RedactingFormatter(logging.Formatter):
 
     def __init__(self, fields: List[str]):
         super(RedactingFormatter, self).__init__(self.FORMAT)
-        self.fields = fields
+        self._fields = tuple(fields)
+        if hyperscan is not None:
+            self._database = _compile_hs_database(self._fields)
+            # Scratch space serves one scan at a time, so each thread
+            # scans with its own clone of this never-used prototype
+            self._scratch = hyperscan.Scratch(self._database)
+            self._local = threading.local()
+            self._redact = self._redact_hs
+        elif ahocorasick is not None:
+            self._automaton = _get_automaton(self._fields)
+            self._redact = self._redact_ac
+        else:
+            self._pattern = _compile_redactor(self._fields, self.SEPARATOR)
+            self._repl = r'\g<field>={}'.format(self.REDACTION)
+            self._redact = self._redact_re
+        if (redact_default is not None
+                and set(self._fields) == set(PII_FIELDS)
+                and self.REDACTION == "***" and self.SEPARATOR == ";"):
+            self._redact_generic = self._redact
+            self._redact = self._redact_ext
+
+    def _redact_hs(self, msg: str) -> str:
+        """redacts a log message with the Hyperscan database.
+        """
+        # Lone surrogates (e.g. from os.fsdecode) round-trip unchanged
+        data = msg.encode('utf-8', 'surrogatepass')
+        spans = []
+
+        def on_match(_id, start, end, _flags, _context):
+            spans.append((start, end))
+
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None:
+            scratch = self._local.scratch = self._scratch.clone()
+        self._database.scan(data, match_event_handler=on_match,
+                            scratch=scratch)
+        return _redact_spans(data, spans, self.REDACTION.encode(),
+                             self.SEPARATOR.encode()
+                             ).decode('utf-8', 'surrogatepass')
+
+    def _redact_ac(self, msg: str) -> str:
+        """redacts a log message with the Aho-Corasick automaton.
+        """
+        spans = ((end + 1 - length, end + 1)
+                 for end, length in self._automaton.iter(msg))
+        return _redact_spans(msg, spans, self.REDACTION, self.SEPARATOR)
+
+    def _redact_re(self, msg: str) -> str:
+        """redacts a log message with the compiled extraction pattern.
+        """
+        return self._pattern.sub(self._repl, msg)
+
+    def _redact_ext(self, msg: str) -> str:
+        """redacts an ASCII log message with the C extension.
+        """
+        if not msg.isascii():
+            return self._redact_generic(msg)
+        data = redact_default(msg.encode('ascii'), b";")
+        return data.decode('ascii')
 
     def format(self, record: logging.LogRecord) -> str:
         """formats a LogRecord.
         """
-        msg = super(RedactingFormatter, self).format(record)
-        txt = filter_datum(self.fields, self.REDACTION, msg, self.SEPARATOR)
-        return txt
+        redacted = copy.copy(record)
+        redacted.msg = self._redact(record.getMessage())
+        redacted.args = None
+        if redacted.exc_text:
+            redacted.exc_text = self._redact(redacted.exc_text)
+        return super(RedactingFormatter, self).format(redacted)
+
+    def formatException(self, ei) -> str:
+        """formats and redacts exception information.
+        """
+        return self._redact(
+            super(RedactingFormatter, self).formatException(ei))
+
+    def formatStack(self, stack_info: str) -> str:
+        """formats and redacts stack information.
+        """
+        return self._redact(
+            super(RedactingFormatter, self).formatStack(stack_info))
 
 
 if __name__ == "__main__":
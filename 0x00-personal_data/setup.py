@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Builds the optional _redact_ext C extension used by filtered_logger.
+
+    python3 setup.py build_ext --inplace
+"""
+from setuptools import Extension, setup
+
+setup(
+    name="redact_ext",
+    ext_modules=[
+        Extension("_redact_ext", ["_redact_ext.c"],
+                  extra_compile_args=["-O3"]),
+    ],
+)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Thin wrapper around the native bcrypt backend.
+
+pyca/bcrypt (>= 4.0) is implemented in Rust, so every hash goes through
+a compiled backend. Callers use this module instead of `bcrypt` directly
+so the backend can be swapped without touching them; hashes keep the
+standard `$2b$` format either way.
+"""
+import bcrypt
+
+
+def hashpw(password: bytes, rounds: int) -> bytes:
+    """
+    Hash a password with a fresh salt.
+    Args:
+        password (bytes): The password to hash.
+        rounds (int): The bcrypt cost factor.
+    Returns:
+        bytes: The hashed password.
+    """
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def checkpw(password: bytes, hashed: bytes) -> bool:
+    """
+    Check a password against a bcrypt hash.
+    Args:
+        password (bytes): The password to check.
+        hashed (bytes): The stored hash.
+    Returns:
+        bool: True if the password matches, False otherwise.
+    """
+    return bcrypt.checkpw(password, hashed)
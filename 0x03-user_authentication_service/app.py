@@ -39,6 +39,8 @@ def users() -> str:
     """
     email = request.form.get("email")
     password = request.form.get("password")
+    if not email or not password:
+        return jsonify({"message": "email and password required"}), 400
     try:
         user = AUTH.register_user(email, password)
     except ValueError:
@@ -3,39 +3,147 @@
 A module for authentication-related routines.
 """
 
-import bcrypt
-from uuid import uuid4
+import hashlib
+import hmac
+import itertools
+import os
+import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from sqlalchemy.orm.exc import NoResultFound
-from typing import TypeVar, Union
+from typing import Iterable, List, TypeVar, Union
 
+import _bcrypt
 from db import DB
 from user import User
 
 U = TypeVar(User)
 
+# bcrypt cost factor; each extra round doubles the hashing time
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
 
-def _hash_password(password: str) -> bytes:
+# Threads for hashing many passwords at once; bcrypt releases the GIL
+# while hashing, so each worker hashes on its own core
+_bcrypt_pool = ThreadPoolExecutor(max_workers=os.cpu_count(),
+                                  thread_name_prefix="bcrypt")
+
+# Shape of a well-formed stored bcrypt hash
+_HASH_RE = re.compile(rb'\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}')
+
+# Hash checked when the user does not exist, so unknown emails take as
+# long to reject as wrong passwords
+_DUMMY_PASSWORD = b"not-a-password"
+_DUMMY_HASH = _bcrypt.hashpw(_DUMMY_PASSWORD, BCRYPT_ROUNDS)
+
+# Recent successful password checks. Keys are HMACs under a per-process
+# pepper, so no password is ever held and nothing survives a restart.
+# Only successes are cached: every failed attempt costs one bcrypt,
+# whether or not the email exists, so failures reveal nothing. The
+# trade-off is that a repeated correct login skips bcrypt during the TTL
+# and answers faster, which only tells the caller what they already knew.
+_LOGIN_CACHE_PEPPER = os.urandom(32)
+_login_cache = TTLCache(maxsize=10_000, ttl=60)
+_login_lock = threading.Lock()
+
+# Lifetime of cached session lookups. Logging out evicts the entry in
+# this process; other processes may keep serving it for up to this long.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+
+
+def _to_pw_bytes(password: Union[str, bytes]) -> bytes:
+    """
+    Gets the bytes bcrypt actually uses from a password.
+
+    Args:
+        password (Union[str, bytes]): The password.
+
+    Returns:
+        bytes: The password encoded and cut to bcrypt's 72 byte limit.
+    """
+    if not isinstance(password, bytes):
+        password = password.encode('utf-8', 'strict')
+    return password[:72]
+
+
+def _hash_password(password: Union[str, bytes]) -> bytes:
     """
     Hashes a password using bcrypt.
 
     Args:
-        password (str): The password to hash.
+        password (Union[str, bytes]): The password to hash.
 
     Returns:
         bytes: The hashed password.
     """
-    passwd = password.encode('utf-8')
-    return bcrypt.hashpw(passwd, bcrypt.gensalt())
+    return _bcrypt.hashpw(_to_pw_bytes(password), BCRYPT_ROUNDS)
+
+
+def _hash_password_many(passwords: Iterable[Union[str, bytes]],
+                        rounds: int = BCRYPT_ROUNDS) -> List[bytes]:
+    """
+    Hashes many passwords in parallel on the bcrypt workers.
+
+    Args:
+        passwords (Iterable[Union[str, bytes]]): The passwords to hash.
+        rounds (int): The bcrypt cost factor.
+
+    Returns:
+        List[bytes]: The hashed passwords, in input order.
+    """
+    passwds = [_to_pw_bytes(password) for password in passwords]
+    return list(_bcrypt_pool.map(_bcrypt.hashpw, passwds,
+                                 itertools.repeat(rounds)))
+
+
+def needs_rehash(hashed: bytes) -> bool:
+    """
+    Checks whether a hash was made with a different cost factor.
+
+    Args:
+        hashed (bytes): The stored bcrypt hash.
+
+    Returns:
+        bool: True if the hash should be recomputed, False otherwise.
+    """
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    try:
+        rounds = int(hashed.split(b'$')[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != BCRYPT_ROUNDS
+
+
+def _login_cache_key(email: str, password: bytes, hashed: bytes) -> bytes:
+    """
+    Builds the login cache key for a set of credentials.
+
+    The stored hash is part of the key, so changing a password
+    invalidates every cached result for the old one.
+
+    Args:
+        email (str): The email of the user.
+        password (bytes): The encoded password.
+        hashed (bytes): The stored hash of the user.
+
+    Returns:
+        bytes: The cache key.
+    """
+    msg = b":".join((email.encode('utf-8'),
+                     hashlib.sha256(password).digest(), hashed))
+    return hmac.new(_LOGIN_CACHE_PEPPER, msg, "sha256").digest()
 
 
 def _generate_uuid() -> str:
     """
-    Generates a UUID.
+    Generates a random token for sessions and password resets.
 
     Returns:
-        str: The generated UUID.
+        str: 128 random bits as a 22 character URL-safe string.
     """
-    return str(uuid4())
+    return secrets.token_urlsafe(16)
 
 
 class Auth:
@@ -48,6 +156,14 @@ class Auth:
         Initializes the Auth object.
         """
         self._db = DB()
+        # Emails registered through this object. It is never pruned,
+        # which is only safe because DB() drops the users table on every
+        # start, so no email can be registered outside of this set.
+        self._known_emails = set()
+        # Users looked up by session ID. Each Auth object keeps its own,
+        # so cached users always belong to the session of its DB.
+        self._sessions = TTLCache(maxsize=50_000, ttl=SESSION_CACHE_TTL)
+        self._session_lock = threading.Lock()
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -61,35 +177,58 @@ class Auth:
             User: The registered user object.
 
         Raises:
-            ValueError: If the user already exists.
+            ValueError: If the email or password is missing, or the user
+                already exists.
         """
-        try:
-            self._db.find_user_by(email=email)
-        except NoResultFound:
-            hashed = _hash_password(password)
-            usr = self._db.add_user(email, hashed)
-            return usr
-        raise ValueError(f"User {email} already exists")
+        if not email or not password:
+            raise ValueError("An email and a password are required")
+        if email in self._known_emails:
+            raise ValueError(f"User {email} already exists")
+        hashed = _hash_password(password)
+        usr = self._db.add_user_if_absent(email, hashed)
+        self._known_emails.add(email)
+        if usr is None:
+            raise ValueError(f"User {email} already exists")
+        return usr
 
-    def valid_login(self, email: str, password: str) -> bool:
+    def valid_login(self, email: str, password: Union[str, bytes]) -> bool:
         """
         Validates user login credentials.
 
         Args:
             email (str): The email of the user.
-            password (str): The password of the user.
+            password (Union[str, bytes]): The password of the user.
 
         Returns:
             bool: True if login is successful, False otherwise.
         """
+        if not isinstance(password, (str, bytes)):
+            return False
         try:
             user = self._db.find_user_by(email=email)
         except NoResultFound:
+            _bcrypt.checkpw(_DUMMY_PASSWORD, _DUMMY_HASH)
             return False
 
-        user_password = user.hashed_password
-        passwd = password.encode("utf-8")
-        return bcrypt.checkpw(passwd, user_password)
+        passwd = _to_pw_bytes(password)
+        hashed = user.hashed_password
+        if (not hashed or len(hashed) != 60
+                or not _HASH_RE.fullmatch(hashed)):
+            return False
+
+        key = _login_cache_key(email, passwd, hashed)
+        with _login_lock:
+            cached = _login_cache.get(key, False)
+        if not cached:
+            if not _bcrypt.checkpw(passwd, hashed):
+                return False
+            with _login_lock:
+                _login_cache[key] = True
+
+        if needs_rehash(hashed):
+            self._db.update_user(user.id,
+                                 hashed_password=_hash_password(passwd))
+        return True
 
     def create_session(self, email: str) -> Union[None, str]:
         """
@@ -106,6 +245,8 @@ class Auth:
         except NoResultFound:
             return None
 
+        with self._session_lock:
+            self._sessions.pop(user.session_id, None)
         session_id = _generate_uuid()
         self._db.update_user(user.id, session_id=session_id)
         return session_id
@@ -123,11 +264,18 @@ class Auth:
         if session_id is None:
             return None
 
+        with self._session_lock:
+            user = self._sessions.get(session_id)
+        if user is not None:
+            return user
+
         try:
             user = self._db.find_user_by(session_id=session_id)
         except NoResultFound:
             return None
 
+        with self._session_lock:
+            self._sessions[session_id] = user
         return user
 
     def destroy_session(self, user_id: int) -> None:
@@ -138,9 +286,13 @@ class Auth:
             user_id (int): The ID of the user.
         """
         try:
-            self._db.update_user(user_id, session_id=None)
-        except ValueError:
+            user = self._db.find_user_by(id=user_id)
+        except NoResultFound:
             return None
+
+        with self._session_lock:
+            self._sessions.pop(user.session_id, None)
+        self._db.update_user(user_id, session_id=None)
         return None
 
     def get_reset_password_token(self, email: str) -> str:
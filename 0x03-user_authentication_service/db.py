@@ -7,7 +7,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from typing import Union
 
 from user import Base, User
 
@@ -34,12 +35,12 @@ class DB:
             self.__session = DBSession()
         return self.__session
 
-    def add_user(self, email: str, hashed_password: str) -> User:
+    def add_user(self, email: str, hashed_password: bytes) -> User:
         """
         Adds a new user to the database.
         Args:
             email (str): user's email address
-            hashed_password (str): password
+            hashed_password (bytes): bcrypt hash of the password
         Return:
             Created User object
         """
@@ -48,20 +49,46 @@ class DB:
         self._session.commit()
         return user
 
+    def add_user_if_absent(self, email: str,
+                           hashed_password: bytes) -> Union[None, User]:
+        """
+        Adds a new user unless the email is already taken.
+        Relies on the unique email index, so it costs a single INSERT.
+        Args:
+            email (str): user's email address
+            hashed_password (bytes): bcrypt hash of the password
+        Return:
+            Created User object, or None if the email already exists
+        Raises:
+            IntegrityError: if the row is rejected for another reason
+        """
+        user = User(email=email, hashed_password=hashed_password)
+        self._session.add(user)
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            taken = self._session.query(User).filter_by(email=email).first()
+            if taken is None:
+                raise
+            return None
+        return user
+
     def find_user_by(self, **kwargs) -> User:
         """
         Returns  a user based on a set of filters.
         Args:
             attributes (dict): a dictionary of attributes to match the user
         """
-        all_users = self._session.query(User)
-        for k, v in kwargs.items():
+        if not kwargs:
+            raise NoResultFound
+        for k in kwargs:
             if k not in User.__dict__:
                 raise InvalidRequestError
-            for usr in all_users:
-                if getattr(usr, k) == v:
-                    return usr
-        raise NoResultFound
+        usr = self._session.query(User).filter_by(**kwargs).first()
+        if usr is None:
+            raise NoResultFound
+        return usr
 
     def update_user(self, user_id: int, **kwargs) -> None:
         """
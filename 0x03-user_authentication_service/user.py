@@ -3,7 +3,7 @@
 Define a SQLAlchemy User model.
 """
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, LargeBinary, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -16,7 +16,7 @@ class User(Base):
     """
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
-    hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    email = Column(String(254), nullable=False, unique=True, index=True)
+    hashed_password = Column(LargeBinary(60), nullable=False)
+    session_id = Column(String(22), nullable=True, index=True)
+    reset_token = Column(String(22), nullable=True, index=True)